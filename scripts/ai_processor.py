@@ -1,13 +1,34 @@
 import os
 import json
+import hashlib
+import heapq
 import logging
 from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
 import time
+import diskcache
+import orjson
+import tiktoken
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Transient API statuses worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _is_retryable_error(exc: BaseException) -> bool:
+    """Whether an API call failure is transient and should be retried"""
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError)):
+        return True
+    return (isinstance(exc, requests.HTTPError) and exc.response is not None
+            and exc.response.status_code in RETRY_STATUSES)
+
 
 class AIProcessor:
     """AI processor for analyzing articles using DeepSeek API"""
@@ -21,7 +42,11 @@ class AIProcessor:
         "观点评论": "行业观点、分析评论"
     }
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "deepseek-ai/DeepSeek-V3"):
+    # How long cached analyses stay valid (seconds)
+    CACHE_EXPIRE = 7 * 86400
+    
+    def __init__(self, api_key: Optional[str] = None, model: str = "deepseek-ai/DeepSeek-V3",
+                 cache_dir: str = "data/ai_cache"):
         self.api_key = api_key or os.getenv('DEEPSEEK_API_KEY')
         if not self.api_key:
             logger.warning("No API key provided, AI processing will be skipped")
@@ -29,38 +54,202 @@ class AIProcessor:
         self.model = model
         self.api_url = "https://api.siliconflow.cn/v1/chat/completions"
         self.batch_size = 5
+        self.system_prompt = self._create_system_prompt()
+        self.max_content_tokens = 1500
+        self.max_workers = 5
+        self.requests_per_minute = int(os.getenv('DEEPSEEK_RPM', '60'))
+        
+        # Pooled keep-alive session reused for every API call; retries are
+        # handled by tenacity in _post_once, so the adapter does not retry
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # On-disk cache of analyses, so re-fetched articles skip the API call
+        self.cache = diskcache.Cache(cache_dir)
+        
+        # Tokenizer used to cap article content, loaded on first use
+        self._encoding = None
+        self._encoding_loaded = False
+        self._encoding_lock = threading.Lock()
+        
+        # Rate limiter state shared across worker threads
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
     
-    def _create_analysis_prompt(self, article: Dict) -> str:
-        """Create prompt for AI analysis"""
-        categories_str = "\n".join([f"- {k}: {v}" for k, v in self.CATEGORIES.items()])
+    def prewarm(self, timeout: float = 5.0):
+        """Open a pooled keep-alive connection to the API host ahead of the first call"""
+        if not self.api_key:
+            return
         
-        prompt = f"""请分析以下文章并返回JSON格式的结果：
-
-文章标题：{article['title']}
-文章来源：{article['source']}
-文章内容：{article['content'][:2000]}
-
-请返回以下信息的JSON格式：
-{{
-  "category": "从以下分类中选择最合适的一个：\n{categories_str}",
-  "summary": "用50-100字总结文章核心内容",
-  "hot_score": "给出热度分数（0-100），综合考虑新闻重要性、时效性、影响力等因素",
-  "keywords": ["提取3-5个关键词"],
-  "reasoning": "简要说明分类和评分理由（20字以内）"
-}}
-
-只返回JSON，不要其他内容。
-"""
-        return prompt
+        parts = urlsplit(self.api_url)
+        try:
+            self.session.head(f"{parts.scheme}://{parts.netloc}/", timeout=timeout, allow_redirects=False)
+            logger.info(f"✓ Prewarmed connection to {parts.netloc}")
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Prewarm failed for {parts.netloc}: {e}")
+    
+    def _wait_for_rate_limit(self):
+        """Block until the next request slot allowed by requests_per_minute"""
+        if self.requests_per_minute <= 0:
+            return
+        
+        interval = 60.0 / self.requests_per_minute
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = max(0.0, self._next_request_at - now)
+            self._next_request_at = max(now, self._next_request_at) + interval
+        
+        if wait:
+            time.sleep(wait)
+    
+    @retry(stop=stop_after_attempt(4), wait=wait_exponential_jitter(initial=1, max=20),
+           retry=retry_if_exception(_is_retryable_error), reraise=True)
+    def _post_once(self, headers: Dict, data: Dict, stream: bool = False) -> requests.Response:
+        """POST a chat completion request, raising on transient failures so it is retried"""
+        self._wait_for_rate_limit()
+        response = self.session.post(self.api_url, headers=headers, json=data, timeout=120, stream=stream)
+        
+        if response.status_code in RETRY_STATUSES:
+            response.close()
+            # Honour the server's Retry-After hint before tenacity backs off
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                time.sleep(min(int(retry_after), 60))
+            raise requests.HTTPError(f"{response.status_code} from DeepSeek API", response=response)
+        
+        response.raise_for_status()
+        return response
+    
+    def _read_stream(self, response: requests.Response) -> str:
+        """Accumulate streamed (SSE) completion deltas until the JSON value closes
+        
+        Brackets are counted outside of string literals, so reading stops as
+        soon as the top-level object/array is complete, ignoring any trailing prose.
+        """
+        parts = []
+        depth = 0
+        started = in_string = escaped = False
+        
+        for line in response.iter_lines():
+            if not line.startswith(b'data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == b'[DONE]':
+                break
+            
+            choices = orjson.loads(payload).get('choices') or [{}]
+            delta = (choices[0].get('delta') or {}).get('content') or ''
+            for i, ch in enumerate(delta):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif ch == '\\':
+                        escaped = True
+                    elif ch == '"':
+                        in_string = False
+                elif ch == '"':
+                    in_string = True
+                elif ch in '{[':
+                    depth += 1
+                    started = True
+                elif ch in '}]':
+                    depth -= 1
+                    if started and depth <= 0:
+                        # Keep only up to the closing bracket, dropping prose in the same delta
+                        parts.append(delta[:i + 1])
+                        logger.debug("JSON closed, stopping stream early")
+                        return ''.join(parts)
+            
+            parts.append(delta)
+        
+        return ''.join(parts)
+    
+    def _parse_results(self, result_text: str) -> List:
+        """Parse the AI response text into a list of analysis objects"""
+        results = orjson.loads(result_text)
+        if isinstance(results, dict):
+            results = results['results'] if isinstance(results.get('results'), list) else [results]
+        return results
+    
+    def _cache_key(self, article: Dict) -> str:
+        """Build the analysis cache key for an article"""
+        raw = self.model + article['title'] + article.get('link', '')
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _get_encoding(self):
+        """Lazily load the tokenizer, or None if it cannot be loaded"""
+        with self._encoding_lock:
+            if not self._encoding_loaded:
+                self._encoding_loaded = True
+                try:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"Tokenizer unavailable, truncating content by characters: {e}")
+            return self._encoding
+    
+    def _truncate_content(self, content: str) -> str:
+        """Truncate article content to max_content_tokens tokens"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return content[:2000]
+        
+        ids = encoding.encode(content, disallowed_special=())
+        if len(ids) <= self.max_content_tokens:
+            return content
+        return encoding.decode(ids[:self.max_content_tokens])
+    
+    def _create_system_prompt(self) -> str:
+        """Create the system prompt holding the constant analysis instructions"""
+        categories_str = "\n".join([f"  - {k}: {v}" for k, v in self.CATEGORIES.items()])
+        
+        return f"""你是一个专业的新闻内容分析师，擅长分类、摘要和热度评分。对每篇文章给出：
+- category: 从以下分类中选择最合适的一个
+{categories_str}
+- summary: 用50-100字总结文章核心内容
+- hot_score: 热度分数（0-100的整数），综合考虑新闻重要性、时效性、影响力等因素
+- keywords: 3-5个关键词
+- reasoning: 分类和评分理由（20字以内）"""
+    
+    def _create_batch_analysis_prompt(self, articles: List[Dict]) -> str:
+        """Create prompt for analyzing several articles in one AI call"""
+        articles_json = json.dumps([
+            {
+                "id": i,
+                "title": article['title'],
+                "source": article['source'],
+                "content": self._truncate_content(article['content'])
+            }
+            for i, article in enumerate(articles)
+        ], ensure_ascii=False, separators=(',', ':'))
+        
+        return (f"{articles_json}\n\n"
+                'Return JSON {"results": [...]} with one object per article, '
+                "keys: id, category, summary, hot_score, keywords, reasoning.")
+    
+    def _parse_analysis(self, result: Dict, article: Dict) -> Dict:
+        """Validate and clean a single analysis object returned by AI"""
+        return {
+            'category': result.get('category', '行业动态'),
+            'summary': result.get('summary', article['summary'][:100]),
+            'hot_score': min(100, max(0, int(result.get('hot_score', 50)))),
+            'keywords': result.get('keywords', [])[:5],
+            'reasoning': result.get('reasoning', '')
+        }
     
-    def _analyze_article(self, article: Dict) -> Optional[Dict]:
-        """Analyze a single article using AI"""
+    def _analyze_batch(self, articles: List[Dict]) -> List[Optional[Dict]]:
+        """Analyze several articles with a single AI call
+        
+        Returns one analysis per article, in order; None marks an article
+        the AI did not return a usable analysis for.
+        """
         if not self.api_key:
             logger.warning("AI client not initialized, skipping analysis")
-            return self._get_default_analysis(article)
+            return [None] * len(articles)
         
         try:
-            prompt = self._create_analysis_prompt(article)
+            prompt = self._create_batch_analysis_prompt(articles)
             
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
@@ -70,51 +259,48 @@ class AIProcessor:
             data = {
                 "model": self.model,
                 "messages": [
-                    {"role": "system", "content": "你是一个专业的新闻内容分析师，擅长分类、摘要和热度评分。"},
+                    {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
+                "response_format": {"type": "json_object"},
                 "temperature": 0.3,
-                "max_tokens": 500
+                "max_tokens": 500 * len(articles)
             }
             
-            response = requests.post(self.api_url, headers=headers, json=data, timeout=60)
-            response.raise_for_status()
-            
-            result = response.json()
-            result_text = result['choices'][0]['message']['content'].strip()
+            with self._post_once(headers, dict(data, stream=True), stream=True) as response:
+                result_text = self._read_stream(response)
             
             # Parse JSON response
             try:
-                # Clean markdown code blocks if present
-                if result_text.startswith("```json"):
-                    result_text = result_text[7:]
-                if result_text.startswith("```"):
-                    result_text = result_text[3:]
-                if result_text.endswith("```"):
-                    result_text = result_text[:-3]
-                result_text = result_text.strip()
-                
-                result = json.loads(result_text)
-                
-                # Validate and clean result
-                analysis = {
-                    'category': result.get('category', '行业动态'),
-                    'summary': result.get('summary', article['summary'][:100]),
-                    'hot_score': min(100, max(0, int(result.get('hot_score', 50)))),
-                    'keywords': result.get('keywords', [])[:5],
-                    'reasoning': result.get('reasoning', '')
-                }
+                results = self._parse_results(result_text)
                 
-                return analysis
+            except orjson.JSONDecodeError:
+                logger.warning("Streamed AI response was not valid JSON, retrying without streaming")
+                response = self._post_once(headers, data)
+                result_text = response.json()['choices'][0]['message']['content']
                 
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse AI response: {e}")
-                logger.debug(f"Response text: {result_text}")
-                return self._get_default_analysis(article)
+                try:
+                    results = self._parse_results(result_text)
+                except orjson.JSONDecodeError as e:
+                    logger.error(f"Failed to parse AI response: {e}")
+                    logger.debug(f"Response text: {result_text}")
+                    return [None] * len(articles)
+            
+            # Zip results back to articles by id
+            analyses = [None] * len(articles)
+            for item in results:
+                try:
+                    idx = int(item.get('id'))
+                    if 0 <= idx < len(articles) and analyses[idx] is None:
+                        analyses[idx] = self._parse_analysis(item, articles[idx])
+                except (AttributeError, TypeError, ValueError) as e:
+                    logger.warning(f"Skipping malformed analysis item: {e}")
+            
+            return analyses
             
         except Exception as e:
-            logger.error(f"Error analyzing article: {e}")
-            return self._get_default_analysis(article)
+            logger.error(f"Error analyzing batch: {e}")
+            return [None] * len(articles)
     
     def _get_default_analysis(self, article: Dict) -> Dict:
         """Get default analysis when AI is not available"""
@@ -127,38 +313,49 @@ class AIProcessor:
         }
     
     def process_batch(self, articles: List[Dict]) -> List[Dict]:
-        """Process a batch of articles"""
-        processed = []
+        """Process a batch of articles with a single AI call, skipping cached ones"""
+        keys = [self._cache_key(article) for article in articles]
+        analyses = [self.cache.get(key) for key in keys]
         
-        for i, article in enumerate(articles):
-            logger.info(f"Analyzing article {i+1}/{len(articles)}: {article['title'][:50]}...")
+        pending = [i for i, analysis in enumerate(analyses) if analysis is None]
+        if pending:
+            logger.info(f"Analyzing {len(pending)} articles "
+                        f"({len(articles) - len(pending)} cached): {articles[pending[0]]['title'][:50]}...")
             
-            analysis = self._analyze_article(article)
+            fresh = self._analyze_batch([articles[i] for i in pending])
+            for i, analysis in zip(pending, fresh):
+                if analysis is not None:
+                    self.cache.set(keys[i], analysis, expire=self.CACHE_EXPIRE)
+                analyses[i] = analysis
+        
+        missing = 0
+        for article, analysis in zip(articles, analyses):
+            if analysis is None:
+                analysis = self._get_default_analysis(article)
+                missing += 1
             article.update(analysis)
-            processed.append(article)
-            
-            # Small delay to avoid rate limiting
-            time.sleep(0.5)
         
-        return processed
+        if missing:
+            logger.warning(f"{missing}/{len(articles)} articles fell back to default analysis")
+        
+        return articles
     
     def process_all(self, articles: List[Dict]) -> List[Dict]:
-        """Process all articles in batches"""
+        """Process all articles in batches, overlapping API calls across worker threads"""
         if not self.api_key:
             logger.warning("No API key configured, processing with default values")
             for article in articles:
                 article.update(self._get_default_analysis(article))
             return articles
         
-        logger.info(f"Starting AI analysis for {len(articles)} articles...")
+        batches = [articles[i:i + self.batch_size] for i in range(0, len(articles), self.batch_size)]
+        logger.info(f"Starting AI analysis for {len(articles)} articles in {len(batches)} batches "
+                    f"({self.max_workers} workers, {self.requests_per_minute} RPM)...")
         
         all_processed = []
-        for i in range(0, len(articles), self.batch_size):
-            batch = articles[i:i + self.batch_size]
-            logger.info(f"Processing batch {i//self.batch_size + 1}/{(len(articles)-1)//self.batch_size + 1}")
-            
-            processed = self.process_batch(batch)
-            all_processed.extend(processed)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for processed in executor.map(self.process_batch, batches):
+                all_processed.extend(processed)
         
         logger.info("✓ AI analysis completed")
         return all_processed
@@ -169,9 +366,13 @@ class AIProcessor:
         logger.info(f"✓ Filtered {len(filtered)} articles with hot_score >= {threshold}")
         return filtered
     
-    def sort_by_hot_score(self, articles: List[Dict], reverse: bool = True) -> List[Dict]:
-        """Sort articles by hot score"""
-        return sorted(articles, key=lambda x: x.get('hot_score', 0), reverse=reverse)
+    def sort_by_hot_score(self, articles: List[Dict], reverse: bool = True,
+                          top_k: Optional[int] = None) -> List[Dict]:
+        """Sort articles by hot score, optionally keeping only the top_k hottest"""
+        key = lambda x: x.get('hot_score', 0)
+        if top_k is not None and reverse:
+            return heapq.nlargest(top_k, articles, key=key)
+        return sorted(articles, key=key, reverse=reverse)[:top_k]
 
 
 def main():
@@ -1,12 +1,33 @@
 import feedparser
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import threading
+import calendar
 import time
 import logging
 from typing import List, Dict, Optional
 import json
 import os
 
+# HTML-to-text stripper, picked once at import: selectolax if available, else BeautifulSoup
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    
+    def _strip_html(html: str) -> str:
+        """Extract plain text from an HTML fragment"""
+        return LexborHTMLParser(html).text(separator=" ", strip=True)
+except ImportError:
+    from bs4 import BeautifulSoup
+    
+    def _strip_html(html: str) -> str:
+        """Extract plain text from an HTML fragment"""
+        return BeautifulSoup(html, 'html.parser').get_text(separator=" ", strip=True)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -14,12 +35,34 @@ logger = logging.getLogger(__name__)
 class RSSFetcher:
     """RSS feed fetcher class"""
     
+    # Query parameters that only track the referrer and never change the article
+    TRACKING_PARAMS = {'fbclid', 'gclid', 'spm'}
+    
     def __init__(self, config_path: str = "config/rss_sources.json"):
         self.config_path = config_path
         self.sources = self._load_sources()
         self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Accept-Encoding': 'gzip, deflate'
         }
+        
+        # Pooled keep-alive session reused across feeds
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        self.max_workers = 16
+        
+        # Per-host politeness gate, so only requests to the same domain are spaced out
+        self._host_locks = {}
+        self._host_locks_guard = threading.Lock()
+        self._host_last_fetch = {}
     
     def _load_sources(self) -> List[Dict]:
         """Load RSS sources from config file"""
@@ -60,21 +103,56 @@ class RSSFetcher:
             }
         ]
     
-    def fetch_feed(self, source: Dict) -> List[Dict]:
+    def prewarm(self, timeout: float = 5.0):
+        """Open a pooled keep-alive connection to every feed host ahead of fetching"""
+        origins = {urlsplit(s['url'])[:2] for s in self.sources}
+        
+        def warm(origin):
+            scheme, host = origin
+            try:
+                self.session.head(f"{scheme}://{host}/", timeout=timeout, allow_redirects=False)
+            except requests.exceptions.RequestException as e:
+                logger.debug(f"Prewarm failed for {host}: {e}")
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(warm, origins))
+        
+        logger.info(f"✓ Prewarmed connections to {len(origins)} hosts")
+    
+    def _wait_for_host(self, url: str, delay: float):
+        """Wait until at least `delay` seconds have passed since the last fetch from the same host"""
+        host = urlsplit(url).netloc
+        with self._host_locks_guard:
+            lock = self._host_locks.setdefault(host, threading.Lock())
+        
+        with lock:
+            last = self._host_last_fetch.get(host)
+            if last is not None:
+                wait = delay - (time.monotonic() - last)
+                if wait > 0:
+                    time.sleep(wait)
+            self._host_last_fetch[host] = time.monotonic()
+    
+    def fetch_feed(self, source: Dict, delay: float = 0.0) -> List[Dict]:
         """Fetch articles from a single RSS feed"""
         url = source['url']
         source_name = source['name']
         articles = []
         
         try:
+            if delay > 0:
+                self._wait_for_host(url, delay)
+            
             logger.info(f"Fetching from {source_name}...")
             
-            # Fetch with timeout
-            response = requests.get(url, headers=self.headers, timeout=30)
-            response.raise_for_status()
+            # Fetch with timeout, releasing the connection as soon as the body is read
+            with self.session.get(url, timeout=30, stream=True) as response:
+                response.raise_for_status()
+                raw = response.content
             
-            # Parse feed
-            feed = feedparser.parse(response.content)
+            # Parse feed straight from the raw bytes, then drop them
+            feed = feedparser.parse(raw)
+            del raw
             
             if feed.bozo:
                 logger.warning(f"Feed parsing warning for {source_name}: {feed.bozo}")
@@ -100,9 +178,9 @@ class RSSFetcher:
             # Get publish date
             published = entry.get('published_parsed')
             if published:
-                pub_date = datetime(*published[:6], tzinfo=timezone.utc)
+                pub_ts = calendar.timegm(published)
             else:
-                pub_date = datetime.now(timezone.utc)
+                pub_ts = int(time.time())
             
             # Get content/description
             content = entry.get('content', [{}])[0].get('value') or \
@@ -110,10 +188,7 @@ class RSSFetcher:
                       entry.get('summary', '')
             
             # Clean HTML tags from content
-            from bs4 import BeautifulSoup
-            if content:
-                soup = BeautifulSoup(content, 'html.parser')
-                content = soup.get_text(strip=True)
+            content = _strip_html(content) if content else ""
             
             # Get authors
             authors = []
@@ -127,7 +202,7 @@ class RSSFetcher:
                 'link': entry.get('link', ''),
                 'content': content[:5000],  # Limit content length
                 'summary': content[:300],
-                'published': pub_date,
+                'published_ts': pub_ts,  # UTC epoch seconds
                 'source': source['name'],
                 'source_category': source.get('category', 'Other'),
                 'language': source.get('language', 'en'),
@@ -142,31 +217,39 @@ class RSSFetcher:
             return None
     
     def fetch_all(self, delay: float = 1.0) -> List[Dict]:
-        """Fetch articles from all configured sources"""
+        """Fetch articles from all configured sources concurrently
+        
+        `delay` is the politeness interval between requests to the same host.
+        """
         all_articles = []
         
         logger.info(f"Starting fetch from {len(self.sources)} sources...")
         
-        for i, source in enumerate(self.sources):
-            articles = self.fetch_feed(source)
-            all_articles.extend(articles)
-            
-            # Add delay between requests to be polite
-            if i < len(self.sources) - 1:
-                time.sleep(delay)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for articles in executor.map(partial(self.fetch_feed, delay=delay), self.sources):
+                all_articles.extend(articles)
         
         logger.info(f"✓ Total articles fetched: {len(all_articles)}")
         
         return all_articles
     
+    def _normalize_link(self, link: str) -> str:
+        """Normalize a link by dropping tracking query params and fragments"""
+        parts = urlsplit(link.strip())
+        query = [
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.startswith('utm_') and k not in self.TRACKING_PARAMS
+        ]
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+    
     def deduplicate(self, articles: List[Dict]) -> List[Dict]:
-        """Remove duplicate articles based on title and link"""
+        """Remove duplicate articles based on title and normalized link"""
         seen = set()
         unique_articles = []
         
         for article in articles:
             # Create a unique key from title and link
-            key = (article['title'], article['link'])
+            key = (article['title'].strip().lower(), self._normalize_link(article['link']))
             
             if key not in seen:
                 seen.add(key)
@@ -188,7 +271,7 @@ def main():
     print(f"\nFetched {len(articles)} unique articles")
     for i, article in enumerate(articles[:5], 1):
         print(f"\n{i}. {article['title']}")
-        print(f"   {article['source']} - {article['published']}")
+        print(f"   {article['source']} - {datetime.fromtimestamp(article['published_ts'], tz=timezone.utc)}")
         print(f"   {article['summary']}")
 
 
@@ -6,11 +6,14 @@ AI资讯哨兵 - 主程序
 
 import os
 import sys
-import json
 import logging
+from collections import Counter
 from datetime import datetime
+from statistics import fmean
 from pathlib import Path
 
+import orjson
+
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
@@ -31,20 +34,20 @@ logger = logging.getLogger(__name__)
 
 
 def save_raw_data(articles: list, output_path: str = "data/articles.json"):
-    """Save raw article data to JSON file"""
+    """Save raw article data to JSON file
+    
+    A .ndjson/.jsonl path is written one article per line, so only a single
+    encoded article is held in memory at a time.
+    """
     output_file = Path(output_path)
     output_file.parent.mkdir(parents=True, exist_ok=True)
     
-    # Convert datetime objects to string for JSON serialization
-    serializable_articles = []
-    for article in articles:
-        article_copy = article.copy()
-        if 'published' in article_copy:
-            article_copy['published'] = article_copy['published'].isoformat()
-        serializable_articles.append(article_copy)
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(serializable_articles, f, ensure_ascii=False, indent=2)
+    with open(output_file, 'wb') as f:
+        if output_file.suffix in ('.ndjson', '.jsonl'):
+            for article in articles:
+                f.write(orjson.dumps(article, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE))
+        else:
+            f.write(orjson.dumps(articles, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     
     logger.info(f"✓ Raw data saved to {output_path}")
 
@@ -56,9 +59,18 @@ def main():
     logger.info("="*60)
     
     try:
+        fetcher = RSSFetcher()
+        
+        api_key = os.getenv('DEEPSEEK_API_KEY', '')
+        processor = AIProcessor(api_key=api_key)
+        
+        # Open keep-alive connections before the first real requests
+        logger.info("\n🔌 预热网络连接...")
+        fetcher.prewarm()
+        processor.prewarm()
+        
         # Step 1: Fetch RSS feeds
         logger.info("\n📡 Step 1: 抓取RSS源...")
-        fetcher = RSSFetcher()
         articles = fetcher.fetch_all()
         
         if not articles:
@@ -71,66 +83,59 @@ def main():
         
         # Step 2: AI Analysis
         logger.info("\n🤖 Step 2: AI智能分析...")
-        api_key = os.getenv('DEEPSEEK_API_KEY', '')
         
         if not api_key:
             logger.warning("⚠️  未配置DEEPSEEK_API_KEY，将使用默认值")
             logger.warning("   如需AI分析，请在GitHub Secrets中配置DEEPSEEK_API_KEY")
         
-        processor = AIProcessor(api_key=api_key)
         articles = processor.process_all(articles)
         
         # Sort by hot score
         articles = processor.sort_by_hot_score(articles)
         logger.info(f"✓ AI分析完成")
         
-        # Step 3: Generate Report
-        logger.info("\n📊 Step 3: 生成HTML报告...")
-        generator = ReportGenerator()
+        # Step 3: Save raw data, before the report adds display-only fields
+        logger.info("\n💾 Step 3: 保存原始数据...")
+        date_str = datetime.now().strftime('%Y-%m-%d')
+        save_raw_data(articles, f"data/articles_{date_str}.json")
         
-        # Generate main report
-        report_path = generator.generate_report(articles, "docs/index.html")
+        # Step 4: Generate Report
+        logger.info("\n📊 Step 4: 生成HTML报告...")
+        generator = ReportGenerator()
         
-        # Create archive entry
-        archive_path = generator.create_archive_entry(articles, "docs/archive")
+        # Generate main report and archive entry
+        report_path, archive_path = generator.generate_and_archive(articles, "docs/index.html", "docs/archive")
         
         logger.info(f"✓ 报告生成完成")
         logger.info(f"  - 最新报告: {report_path}")
         logger.info(f"  - 历史存档: {archive_path}")
         
-        # Step 4: Save raw data
-        logger.info("\n💾 Step 4: 保存原始数据...")
-        date_str = datetime.now().strftime('%Y-%m-%d')
-        save_raw_data(articles, f"data/articles_{date_str}.json")
-        
         # Print summary
         logger.info("\n" + "="*60)
         logger.info("📊 运行摘要")
         logger.info("="*60)
         logger.info(f"总文章数: {len(articles)}")
         
-        # Category breakdown
-        categories = {}
+        # Category/source breakdown and hot scores in a single pass
+        categories = Counter()
+        sources = Counter()
+        scores = []
         for article in articles:
-            cat = article.get('category', 'Unknown')
-            categories[cat] = categories.get(cat, 0) + 1
+            categories[article.get('category', 'Unknown')] += 1
+            sources[article.get('source', 'Unknown')] += 1
+            scores.append(article.get('hot_score', 0))
         
         logger.info("分类分布:")
-        for cat, count in sorted(categories.items(), key=lambda x: x[1], reverse=True):
+        for cat, count in categories.most_common():
             logger.info(f"  - {cat}: {count}")
         
         # Average hot score
-        avg_score = sum(a.get('hot_score', 0) for a in articles) / len(articles) if articles else 0
+        avg_score = fmean(scores) if scores else 0
         logger.info(f"平均热度分数: {avg_score:.1f}")
         
         # Source breakdown (top 10)
-        sources = {}
-        for article in articles:
-            source = article.get('source', 'Unknown')
-            sources[source] = sources.get(source, 0) + 1
-        
         logger.info("\nTop 10 资讯来源:")
-        for source, count in sorted(sources.items(), key=lambda x: x[1], reverse=True)[:10]:
+        for source, count in sources.most_common(10):
             logger.info(f"  - {source}: {count}")
         
         logger.info("="*60)
@@ -1,346 +1,93 @@
-from jinja2 import Template
-from datetime import datetime
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from datetime import datetime, timezone
 from pathlib import Path
+from operator import itemgetter
 import json
-from typing import List, Dict
+import gzip
+import shutil
+from typing import List, Dict, Iterable, Iterator, Optional
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _collapse_whitespace(chunks: Iterable[str]) -> Iterator[str]:
+    """Strip trailing whitespace and drop blank lines from streamed template output"""
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            line = line.rstrip()
+            if line:
+                yield line + '\n'
+    
+    pending = pending.rstrip()
+    if pending:
+        yield pending
+
+
+# Templates shipped with the project, independent of the working directory
+DEFAULT_TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates"
+
+
 class ReportGenerator:
     """HTML report generator"""
     
-    def __init__(self, template_dir: str = "templates"):
-        self.template_dir = Path(template_dir)
-        self.templates = self._load_templates()
+    def __init__(self, template_dir: Optional[str] = None):
+        self.template_dir = Path(template_dir) if template_dir else DEFAULT_TEMPLATE_DIR
+        
+        # Compiled templates are cached on disk and reused across runs
+        cache_dir = self.template_dir / ".cache"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        self.env = Environment(
+            loader=FileSystemLoader(str(self.template_dir)),
+            bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+            auto_reload=False,
+            trim_blocks=True,
+            lstrip_blocks=True
+        )
+        self.template = self.env.get_template("report.html.j2")
     
-    def _load_templates(self) -> Dict[str, Template]:
-        """Load HTML templates"""
-        templates = {}
-        
-        # Main report template
-        templates['main'] = Template(self._get_main_template())
-        
-        return templates
+    def _format_timestamp(self, ts: int) -> str:
+        """Format a UTC epoch timestamp for display"""
+        return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d %H:%M')
     
-    def _get_main_template(self) -> str:
-        """Get the main HTML template"""
-        return '''<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{{ report_date }} - AI资讯哨兵</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 20px;
-            line-height: 1.6;
-        }
-        
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 20px;
-            box-shadow: 0 20px 60px rgba(0, 0, 0, 0.3);
-            overflow: hidden;
-        }
-        
-        .header {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 40px 30px;
-            text-align: center;
-        }
-        
-        .header h1 {
-            font-size: 2.5em;
-            margin-bottom: 10px;
-            text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.2);
-        }
-        
-        .header .date {
-            font-size: 1.2em;
-            opacity: 0.9;
-        }
-        
-        .stats {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 20px;
-            padding: 30px;
-            background: #f8f9fa;
-        }
-        
-        .stat-card {
-            background: white;
-            padding: 20px;
-            border-radius: 12px;
-            text-align: center;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
-        }
-        
-        .stat-card .number {
-            font-size: 2.5em;
-            font-weight: bold;
-            color: #667eea;
-        }
-        
-        .stat-card .label {
-            color: #666;
-            margin-top: 5px;
-        }
-        
-        .content {
-            padding: 30px;
-        }
-        
-        .category-section {
-            margin-bottom: 40px;
-        }
-        
-        .category-title {
-            font-size: 1.8em;
-            margin-bottom: 20px;
-            padding-bottom: 10px;
-            border-bottom: 3px solid #667eea;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-        
-        .category-badge {
-            display: inline-block;
-            padding: 5px 15px;
-            border-radius: 20px;
-            font-size: 0.9em;
-            font-weight: bold;
-        }
-        
-        .badge-重大新闻 { background: #dc2626; color: white; }
-        .badge-行业动态 { background: #ea580c; color: white; }
-        .badge-产品发布 { background: #16a34a; color: white; }
-        .badge-技术干货 { background: #2563eb; color: white; }
-        .badge-观点评论 { background: #9333ea; color: white; }
-        
-        .article {
-            background: #f8f9fa;
-            border-radius: 12px;
-            padding: 25px;
-            margin-bottom: 20px;
-            transition: transform 0.2s, box-shadow 0.2s;
-            border-left: 4px solid #667eea;
-        }
-        
-        .article:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 5px 15px rgba(0, 0, 0, 0.15);
-        }
-        
-        .article-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: flex-start;
-            margin-bottom: 10px;
-            gap: 15px;
-        }
-        
-        .article-title {
-            font-size: 1.3em;
-            font-weight: bold;
-            color: #1a1a1a;
-            flex: 1;
-        }
-        
-        .article-title a {
-            color: inherit;
-            text-decoration: none;
-            transition: color 0.2s;
-        }
-        
-        .article-title a:hover {
-            color: #667eea;
-        }
-        
-        .hot-score {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 5px 12px;
-            border-radius: 20px;
-            font-size: 0.9em;
-            font-weight: bold;
-            white-space: nowrap;
-        }
-        
-        .article-meta {
-            display: flex;
-            gap: 20px;
-            margin-bottom: 10px;
-            font-size: 0.9em;
-            color: #666;
-        }
-        
-        .article-meta span {
-            display: flex;
-            align-items: center;
-            gap: 5px;
-        }
-        
-        .article-summary {
-            color: #444;
-            margin-bottom: 15px;
-            line-height: 1.7;
-        }
-        
-        .article-keywords {
-            display: flex;
-            flex-wrap: wrap;
-            gap: 8px;
-        }
-        
-        .keyword {
-            background: #e0e7ff;
-            color: #4338ca;
-            padding: 3px 10px;
-            border-radius: 15px;
-            font-size: 0.85em;
-        }
-        
-        .footer {
-            background: #f8f9fa;
-            padding: 30px;
-            text-align: center;
-            color: #666;
-            border-top: 1px solid #e0e0e0;
-        }
-        
-        .footer a {
-            color: #667eea;
-            text-decoration: none;
-        }
-        
-        .archive-link {
-            display: inline-block;
-            margin-top: 10px;
-            padding: 10px 20px;
-            background: #667eea;
-            color: white;
-            border-radius: 20px;
-            text-decoration: none;
-            transition: background 0.2s;
-        }
-        
-        .archive-link:hover {
-            background: #5568d3;
-        }
-        
-        @media (max-width: 768px) {
-            .stats {
-                grid-template-columns: 1fr;
-            }
-            
-            .article-header {
-                flex-direction: column;
-            }
+    def _copy_stylesheet(self, output_file: Path, css_href: str):
+        """Copy the report stylesheet to where css_href points, relative to the report"""
+        src = self.template_dir / "assets" / "report.css"
+        dest = output_file.parent / css_href
+        
+        if not dest.exists() or dest.stat().st_mtime < src.stat().st_mtime:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(src, dest)
+    
+    def _write_output(self, output_file: Path, chunks: Iterable[bytes]):
+        """Atomically write chunks to output_file, gzipping them into a .gz sibling in the same pass"""
+        gz_file = output_file.with_name(output_file.name + '.gz')
+        tmp_file = output_file.with_name(output_file.name + '.tmp')
+        gz_tmp_file = gz_file.with_name(gz_file.name + '.tmp')
+        
+        try:
+            with open(tmp_file, 'wb') as f, open(gz_tmp_file, 'wb') as raw_gz, \
+                    gzip.GzipFile(filename=output_file.name, fileobj=raw_gz, mode='wb', compresslevel=6) as gz:
+                for chunk in chunks:
+                    f.write(chunk)
+                    gz.write(chunk)
             
-            .article-meta {
-                flex-direction: column;
-                gap: 10px;
-            }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>📰 AI资讯哨兵</h1>
-            <div class="date">{{ report_date }}</div>
-        </div>
-        
-        <div class="stats">
-            <div class="stat-card">
-                <div class="number">{{ total_articles }}</div>
-                <div class="label">总文章数</div>
-            </div>
-            <div class="stat-card">
-                <div class="number">{{ "%.1f"|format(avg_hot_score) }}</div>
-                <div class="label">平均热度</div>
-            </div>
-            <div class="stat-card">
-                <div class="number">{{ total_sources }}</div>
-                <div class="label">资讯来源</div>
-            </div>
-            <div class="stat-card">
-                <div class="number">{{ total_categories }}</div>
-                <div class="label">新闻分类</div>
-            </div>
-        </div>
-        
-        <div class="content">
-            {% for category_name, category_articles in categories.items() %}
-            {% if category_articles %}
-            <div class="category-section">
-                <div class="category-title">
-                    <span class="category-badge badge-{{ category_name }}">{{ category_name }}</span>
-                    <span>{{ category_articles|length }} 篇文章</span>
-                </div>
-                
-                {% for article in category_articles %}
-                <div class="article">
-                    <div class="article-header">
-                        <div class="article-title">
-                            <a href="{{ article.link }}" target="_blank">{{ article.title }}</a>
-                        </div>
-                        <div class="hot-score">热度: {{ article.hot_score }}</div>
-                    </div>
-                    
-                    <div class="article-meta">
-                        <span>📅 {{ article.published.strftime('%Y-%m-%d %H:%M') }}</span>
-                        <span>📌 {{ article.source }}</span>
-                        {% if article.reasoning %}
-                        <span>💡 {{ article.reasoning }}</span>
-                        {% endif %}
-                    </div>
-                    
-                    <div class="article-summary">
-                        {{ article.summary }}
-                    </div>
-                    
-                    {% if article.keywords %}
-                    <div class="article-keywords">
-                        {% for keyword in article.keywords[:5] %}
-                        <span class="keyword">{{ keyword }}</span>
-                        {% endfor %}
-                    </div>
-                    {% endif %}
-                </div>
-                {% endfor %}
-            </div>
-            {% endif %}
-            {% endfor %}
-        </div>
-        
-        <div class="footer">
-            <p>由 AI资讯哨兵 自动生成 | Powered by <a href="https://www.deepseek.com" target="_blank">DeepSeek</a></p>
-            <p>生成时间: {{ generation_time }}</p>
-            <a href="archive/" class="archive-link">📚 查看历史存档</a>
-        </div>
-    </div>
-</body>
-</html>'''
+            # Rename into place so readers never see a half-written report;
+            # .gz first so a new index.html is never paired with an older .gz
+            gz_tmp_file.replace(gz_file)
+            tmp_file.replace(output_file)
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            gz_tmp_file.unlink(missing_ok=True)
+            raise
     
-    def generate_report(self, articles: List[Dict], output_path: str = "docs/index.html"):
-        """Generate HTML report from articles"""
+    def _build_context(self, articles: List[Dict], now: datetime) -> Dict:
+        """Group articles by category and compute the template context"""
         # Group articles by category
         categories = {}
         category_order = ['重大新闻', '行业动态', '产品发布', '技术干货', '观点评论']
@@ -348,68 +95,121 @@ class ReportGenerator:
         for cat in category_order:
             categories[cat] = []
         
+        # Group articles and accumulate statistics in a single pass
+        hot_sum = 0
+        sources = set()
         for article in articles:
             cat = article.get('category', '行业动态')
-            if cat not in categories:
-                categories[cat] = []
-            categories[cat].append(article)
+            categories.setdefault(cat, []).append(article)
+            article['hot_score'] = article.get('hot_score', 0)
+            hot_sum += article['hot_score']
+            keywords = article.get('keywords')
+            article['keywords'] = keywords[:5] if keywords else ()
+            article['has_reasoning'] = bool(article.get('reasoning'))
+            published_ts = article.get('published_ts')
+            article['published_str'] = self._format_timestamp(published_ts) if published_ts is not None else ''
+            sources.add(article.get('source') or '')
+        
+        # Drop empty categories so the template only iterates populated ones
+        categories = {k: v for k, v in categories.items() if v}
         
         # Sort articles in each category by hot_score
-        for cat in categories:
-            categories[cat].sort(key=lambda x: x.get('hot_score', 0), reverse=True)
+        for category_articles in categories.values():
+            category_articles.sort(key=itemgetter('hot_score'), reverse=True)
         
         # Calculate statistics
         total_articles = len(articles)
-        avg_hot_score = sum(a.get('hot_score', 0) for a in articles) / total_articles if articles else 0
-        total_sources = len(set(a.get('source', '') for a in articles))
-        total_categories = len([c for c in categories.values() if c])
+        avg_hot_score = hot_sum / total_articles if articles else 0
+        total_sources = len(sources)
+        total_categories = len(categories)
         
         # Generate report
-        report_date = datetime.now().strftime('%Y年%m月%d日')
-        generation_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        html = self.templates['main'].render(
-            report_date=report_date,
-            generation_time=generation_time,
-            total_articles=total_articles,
-            avg_hot_score=avg_hot_score,
-            total_sources=total_sources,
-            total_categories=total_categories,
-            categories=categories
-        )
+        report_date = now.strftime('%Y年%m月%d日')
+        generation_time = now.strftime('%Y-%m-%d %H:%M:%S')
+        
+        return {
+            'report_date': report_date,
+            'generation_time': generation_time,
+            'total_articles': total_articles,
+            'avg_hot_score': avg_hot_score,
+            'total_sources': total_sources,
+            'total_categories': total_categories,
+            'categories': categories
+        }
+    
+    def _render_html(self, articles: List[Dict], css_href: str = "assets/report.css", *,
+                     now: Optional[datetime] = None) -> bytes:
+        """Render the report HTML for articles as UTF-8 bytes"""
+        now = now or datetime.now()
+        chunks = self.template.generate(css_href=css_href, **self._build_context(articles, now))
+        return ''.join(_collapse_whitespace(chunks)).encode('utf-8')
+    
+    def generate_report(self, articles: List[Dict], output_path: str = "docs/index.html",
+                        css_href: str = "assets/report.css", *, now: Optional[datetime] = None):
+        """Generate HTML report from articles"""
+        now = now or datetime.now()
+        context = self._build_context(articles, now)
         
         # Ensure output directory exists
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
+        self._copy_stylesheet(output_file, css_href)
         
-        # Write HTML file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+        # Stream-render the HTML straight into the file
+        chunks = self.template.generate(css_href=css_href, **context)
+        self._write_output(output_file, (line.encode('utf-8') for line in _collapse_whitespace(chunks)))
         
         logger.info(f"✓ Report generated: {output_path}")
         
         return output_path
     
-    def create_archive_entry(self, articles: List[Dict], archive_dir: str = "docs/archive"):
+    def create_archive_entry(self, articles: List[Dict], archive_dir: str = "docs/archive", *,
+                             now: Optional[datetime] = None):
         """Create archive entry for current report"""
+        now = now or datetime.now()
         archive_path = Path(archive_dir)
         archive_path.mkdir(parents=True, exist_ok=True)
         
         # Archive filename with date
-        date_str = datetime.now().strftime('%Y-%m-%d')
+        date_str = now.strftime('%Y-%m-%d')
         archive_file = archive_path / f"report_{date_str}.html"
         
         # Generate report
-        self.generate_report(articles, str(archive_file))
+        self.generate_report(articles, str(archive_file), now=now)
         
         logger.info(f"✓ Archive created: {archive_file}")
         
         return archive_file
+    
+    def generate_and_archive(self, articles: List[Dict], index_path: str = "docs/index.html",
+                             archive_dir: str = "docs/archive"):
+        """Generate the main report and today's archive entry from a single render
+        
+        Every report links assets/report.css next to itself, so the same
+        bytes are valid in either location.
+        """
+        now = datetime.now()
+        css_href = "assets/report.css"
+        html = self._render_html(articles, css_href, now=now)
+        
+        date_str = now.strftime('%Y-%m-%d')
+        index_file = Path(index_path)
+        archive_file = Path(archive_dir) / f"report_{date_str}.html"
+        
+        for output_file in (index_file, archive_file):
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            self._copy_stylesheet(output_file, css_href)
+            self._write_output(output_file, (html,))
+        
+        logger.info(f"✓ Report generated: {index_path}")
+        logger.info(f"✓ Archive created: {archive_file}")
+        
+        return index_path, archive_file
 
 
 def main():
     """Test the report generator"""
-    from datetime import datetime, timezone
+    import time
     
     # Test articles
     test_articles = [
@@ -420,7 +220,7 @@ def main():
             'category': '重大新闻',
             'hot_score': 85,
             'source': 'Test Source',
-            'published': datetime.now(timezone.utc),
+            'published_ts': int(time.time()),
             'keywords': ['测试', '文章', 'AI'],
             'reasoning': '测试原因'
         }